@@ -1,69 +1,130 @@
 from utils import common as common
 import pandas as pd
-import usaddress
 import numpy as np
 
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None
+
+
+# rows per chunk when streaming the raw csv. only one chunk's raw address
+# blobs and tagger results are held at a time, the formatted rows of every
+# chunk are still kept until they're joined at the end
+CHUNK_SIZE = 500
+
+# full state names to two letter abbreviations, shared by every chunk
+_US_STATES = common.country_us.us_state_to_abbrev
+
+
+def load_raw_csv(csv_data):
+    '''
+    yields the raw arena-guide csv in chunks. the file only carries a name
+    and an address, the street, city and state columns get filled in from
+    the parsed address. pyarrow's multithreaded reader is used when
+    installed
+    '''
+    columns = ["Name", "Address", "street", "city", "state"]
+
+    if pa is not None:
+        reader = pacsv.open_csv(
+            csv_data,
+            read_options=pacsv.ReadOptions(column_names=columns[:2],
+                                           block_size=CHUNK_SIZE * 128),
+            parse_options=pacsv.ParseOptions(delimiter=';',
+                                             newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types={c: pa.string() for c in columns[:2]},
+                strings_can_be_null=True)
+            )
+        for batch in reader:
+            yield batch.to_pandas().reindex(columns=columns)
+        return
+
+    yield from pd.read_csv(csv_data,
+                           sep=';',
+                           engine='c',
+                           dtype=str,
+                           names=columns,
+                           chunksize=CHUNK_SIZE)
+
 
 def address_formatter(x):
     # keep x for error reporting, use address for
     # processing/assembling data
     address = x
 
+    # empty or too short to hold a street, skip the tagger entirely
+    if not isinstance(x, str) or len(x.strip()) < 6:
+        return (np.nan, np.nan, np.nan)
+
     try:
-        address = usaddress.tag(address)
+        address = common.tag_address(address)
         address = address[0]
         street = address['StreetName'] + ' ' + address['StreetNamePostType']
         street = common.country_us._remove_punctuation(street)
-        results = {
-            'street': street,
-            'city': address['PlaceName'],
-            'state': address['StateName']
-            }
+        results = (street, address['PlaceName'], address['StateName'])
 
-    except:
+    except Exception:
         print("failed to parse:", x)
-        results = {'street': np.nan, 'city': np.nan, 'state': np.nan}
+        results = (np.nan, np.nan, np.nan)
 
     return results
 
 
-def process_arena_guide():
-    # setup US States mappings
-    states = common.country_us.us_state_to_abbrev
-    csv_data = '/tmp/ice-maker_raw_csv_arena-guide.csv'
-
-    # Load the data of csv
-    df = pd.read_csv(csv_data,
-                    sep=';',
-                    engine='python',
-                    names=["Name", "Address", "street", "city", "state"])
-
+def format_chunk(df, pool, seen):
     # remove any UTF-8 wierdness from WP scraping
     df['Name'] = df['Name'].apply(common.reset_utf8)
 
-    # drop any obvious dupes, they're going to happen
-    # and apply some normalization to the address section
-
-    df['city'] = df['city'].apply(common.country_us._remove_punctuation)
-    df['street'] = df['street'].apply(common.country_us._remove_punctuation)
-    df = df.drop_duplicates()
-    df['Address'] = df['Address'].apply(address_formatter)
+    # drop any obvious dupes, they're going to happen. listings often
+    # repeat an address with different case or spacing, so key on a
+    # normalized address and collapse those before the expensive parse.
+    # seen carries the keys of earlier chunks, so a dupe is caught no
+    # matter where the chunk boundaries fall
+    addr_keys = (df['Address'].str.lower()
+                 .str.replace(r'\s+', ' ', regex=True)
+                 .str.strip())
+    keep = []
+    for key in zip(df['Name'], addr_keys):
+        keep.append(key not in seen)
+        seen.add(key)
+    df = df[keep].copy()
+    parsed = common.parallel_map(address_formatter, df['Address'].tolist(),
+                                 pool=pool)
 
     # convert street section to street addres column, and city, and state
-    df['street'] = df.apply(lambda row: row.Address['street'], axis=1)
-    df['city'] = df.apply(lambda row: row.Address['city'], axis=1)
-    df['state'] = df.apply(lambda row: row.Address['state'], axis=1)
+    # then delete the old address blob so it never piles up across chunks
+    df[['street', 'city', 'state']] = pd.DataFrame(
+        parsed, index=df.index, columns=['street', 'city', 'state'])
+    df = df.drop('Address', axis=1)
 
     # convert any full length state name to two letter abbreviation
-    df['state'] = df['state'].map(lambda x: states.get(x, x))
-    df['street'] = df['street'].map(common.country_us._lookup_words)
+    df['state'] = df['state'].map(_US_STATES).fillna(df['state'])
+    df['street'] = common.apply_unique(df['street'],
+                                       common.country_us._lookup_words)
 
     df['Name'] = df['Name'].apply(common.country_us._expand_rec_ctrs)
 
     # remove any row w/o all fields preset (because they failed to parse)
-    df = df.dropna()
-    # delete the old address blob to clean up & drop any remaining dupes
-    df = df.drop('Address', axis=1)
+    return df.dropna()
+
+
+def process_arena_guide():
+    csv_data = '/tmp/ice-maker_raw_csv_arena-guide.csv'
+
+    # Load the data of csv a chunk at a time, sharing one pool of
+    # address taggers and the set of names/addresses already seen
+    # between the chunks
+    parts = []
+    seen = set()
+    with common.address_pool() as pool:
+        for chunk in load_raw_csv(csv_data):
+            parts.append(format_chunk(chunk, pool, seen))
+
+    # different raw addresses can still parse to the same row
+    df = pd.concat(parts, ignore_index=True)
+    df['state'] = df['state'].astype('category')
     df = df.drop_duplicates()
 
     return df
@@ -1,5 +1,4 @@
 import pandas as pd
-import usaddress
 import numpy as np
 from utils import common
 
@@ -9,14 +8,18 @@ def address_formatter(x):
     # processing/assembling data
     address = x
 
+    # empty or too short to hold a street, skip the tagger entirely
+    if not isinstance(x, str) or len(x.strip()) < 6:
+        return np.nan
+
     try:
-        address = usaddress.tag(address)
+        address = common.tag_address(address)
         address = address[0]
         street = address['StreetName'] + ' ' + address['StreetNamePostType']
-        results = {'street': street}
-    except:
+        results = street
+    except Exception:
         print("failed to parse:", x)
-        results = {'street': np.nan}
+        results = np.nan
 
     return results
 
@@ -27,7 +30,8 @@ def process_sk8stuff():
     # Load the data of csv
     df = pd.read_csv(csv_data,
                     sep=';',
-                    engine='python',
+                    engine='c',
+                    dtype=str,
                     names=["Name", "street", "city", "state"])
 
     # remove any UTF-8 wierdness from WP scraping
@@ -35,17 +39,22 @@ def process_sk8stuff():
 
     # drop any obvious dupes, they're going to happen
     # and apply some normalization to the address section
-    df['city'] = df['city'].apply(common.country_us._remove_punctuation)
-    df['street'] = df['street'].apply(common.country_us._remove_punctuation)
-    df['street'] = df['street'].map(common.country_us._lookup_words)
+    df['city'] = common.apply_unique(df['city'],
+                                     common.country_us._remove_punctuation)
+    df['street'] = common.apply_unique(df['street'],
+                                       common.country_us._remove_punctuation)
+    df['street'] = common.apply_unique(df['street'],
+                                       common.country_us._lookup_words)
     df = df.drop_duplicates()
-    df['street'] = df['street'].apply(address_formatter)
-    df['street'] = df.apply(lambda row: row.street['street'], axis=1)
+    df['street'] = common.parallel_map(address_formatter,
+                                       df['street'].tolist())
 
     df['Name'] = df['Name'].apply(common.country_us._expand_rec_ctrs)
 
     # remove any row w/o all fields preset (because they failed to parse)
     df = df.dropna()
+    # only a few dozen states, store them as categories
+    df['state'] = df['state'].astype('category')
     # delete the old address blob to clean up & drop any remaining dupes
     df = df.drop_duplicates()
 
@@ -1,14 +1,10 @@
 import parsers.sk8stuff as sk8stuff
 import parsers.arena_guide as arena_guide
 import parsers.learntoskate as lts
+from concurrent.futures import ThreadPoolExecutor
 import argparse
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--source", help="show some useful help text")
-args = vars(parser.parse_args())
-
-
 def generate_lts():
     print('Generating RAW CSV for LTS...')
 
@@ -37,15 +33,25 @@ def generate_arena_guide():
     print('Complete! CSV located at', path)
 
 
-if args['source'] == 'sk8stuff':
-    generate_sk8stuff()
-elif args['source'] == 'arena_guide':
-    generate_arena_guide()
-elif args['source'] == 'lts':
-    generate_lts()
-elif args['source'] == 'all':
-    generate_sk8stuff()
-    generate_arena_guide()
-    generate_lts()
-else:
-    print('No Known Source Specified')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", help="show some useful help text")
+    args = vars(parser.parse_args())
+
+    if args['source'] == 'sk8stuff':
+        generate_sk8stuff()
+    elif args['source'] == 'arena_guide':
+        generate_arena_guide()
+    elif args['source'] == 'lts':
+        generate_lts()
+    elif args['source'] == 'all':
+        # each source is a different site and almost all network wait,
+        # so run them side by side and finish when the slowest one does
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            jobs = [executor.submit(generate_sk8stuff),
+                    executor.submit(generate_arena_guide),
+                    executor.submit(generate_lts)]
+        for job in jobs:
+            job.result()
+    else:
+        print('No Known Source Specified')
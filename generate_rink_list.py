@@ -1,76 +1,128 @@
 from formatters import sk8stuff as sk8stuff
 from formatters import arena_guide as arena_guide
 from formatters import learntoskate
+from utils import common
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import pandas as pd
 import argparse
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--source", help="show some useful help text")
-args = vars(parser.parse_args())
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None
+
+
+def write_report(df, report):
+    '''
+    writes a formatted report as headerless ';' separated csv.
+    pyarrow's writer is used when installed since it encodes in C, but
+    without any quoting so the file matches pandas byte for byte. a report
+    with a value that would need quotes goes through pandas instead
+    '''
+    if pa is not None:
+        # pyarrow always writes six digit fractions on timestamps, pandas
+        # leaves them off when a column has none, so pass the dates the
+        # way pandas would write them
+        dates = df.select_dtypes(include='datetime').columns
+        table = pa.Table.from_pandas(
+            df.assign(**{c: df[c].astype(str) for c in dates}),
+            preserve_index=False)
+        options = pacsv.WriteOptions(delimiter=';', include_header=False,
+                                     quoting_style='none')
+        try:
+            pacsv.write_csv(table, report, write_options=options)
+            return
+        except pa.ArrowInvalid:
+            pass
+
+    df.to_csv(report, sep=';', encoding='utf-8', index=False, header=False)
 
 
-def generate_arena_guide():
+def generate_arena_guide(write=True):
 
     report = '/tmp/ice-maker_formatted_arena-guide.csv'
 
-    df = pd.DataFrame(arena_guide.process_arena_guide())
-    df = df.assign(Date=datetime.now())
-    df = df.assign(Source='Arena-Guide')
-    print("Generating report to", report)
-    df.to_csv(report, sep=';', encoding='utf-8', index=False, header=False)
+    df = arena_guide.process_arena_guide()
+    df['Date'] = datetime.now()
+    df['Source'] = pd.Categorical(['Arena-Guide'] * len(df))
+    if write:
+        print("Generating report to", report)
+        write_report(df, report)
 
     return df
 
 
-def generate_learntoskate():
+def generate_learntoskate(write=True):
 
     report = '/tmp/ice-maker_formatted_lts.csv'
 
-    df = pd.DataFrame(learntoskate.process_lts())
-    df = df.assign(Date=datetime.now())
-    df = df.assign(Source='LTS')
-    print("Generating report to", report)
-    df.to_csv(report, sep=';', encoding='utf-8', index=False, header=False)
+    df = learntoskate.process_lts()
+    df['Date'] = datetime.now()
+    df['Source'] = pd.Categorical(['LTS'] * len(df))
+    if write:
+        print("Generating report to", report)
+        write_report(df, report)
 
     return df
 
 
-def generate_sk8stuff():
+def generate_sk8stuff(write=True):
 
     report = '/tmp/ice-maker_formatted_sk8stuff.csv'
 
-    df = pd.DataFrame(sk8stuff.process_sk8stuff())
-    df = df.assign(Date=datetime.now())
-    df = df.assign(Source='Sk8Stuff')
+    df = sk8stuff.process_sk8stuff()
+    df['Date'] = datetime.now()
+    df['Source'] = pd.Categorical(['Sk8Stuff'] * len(df))
 
-    print("Generating report to", report)
-    df.to_csv(report, sep=';', encoding='utf-8', index=False, header=False)
+    if write:
+        print("Generating report to", report)
+        write_report(df, report)
 
     return df
 
 
-if args['source'] == 'sk8stuff':
-    generate_sk8stuff()
+# the formatters fan out to worker processes, so only run the cli
+# from the main process
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", help="show some useful help text")
+    args = vars(parser.parse_args())
+
+    if args['source'] == 'sk8stuff':
+        generate_sk8stuff()
+
+    elif args['source'] == 'arena_guide':
+        generate_arena_guide()
+
+    elif args['source'] == 'lts':
+        generate_learntoskate()
 
-elif args['source'] == 'arena_guide':
-    generate_arena_guide()
+    elif args['source'] == 'all':
+        report = '/tmp/ice-maker_formatted_all.csv'
+        df0 = pd.DataFrame()
 
-elif args['source'] == 'lts':
-    generate_learntoskate()
+        # each source is formatted independently, so run them side by side.
+        # every formatter tags with its own address pool, split the cores
+        # between the three of them so the pools don't fight over cpus
+        with ProcessPoolExecutor(max_workers=3,
+                                 initializer=common.share_cores,
+                                 initargs=(3,)) as executor:
+            # only the master report gets written, skip the per source ones
+            futures = [executor.submit(generate_sk8stuff, write=False),
+                       executor.submit(generate_arena_guide, write=False),
+                       executor.submit(generate_learntoskate, write=False)]
+            df1, df2, df3 = [future.result() for future in futures]
 
-elif args['source'] == 'all':
-    report = '/tmp/ice-maker_formatted_all.csv'
-    df0 = pd.DataFrame()
-    df1 = generate_sk8stuff()
-    df2 = generate_arena_guide()
-    df3 = generate_learntoskate()
+        df0 = pd.concat([df1, df2, df3], axis=0)
 
-    df0 = pd.concat([df1, df2, df3], axis=0)
+        # the same rink is often listed by more than one source
+        df0 = df0.drop_duplicates(subset=['Name', 'street', 'city', 'state'])
 
-    print("Generating master report to", report)
-    df0.to_csv(report, sep=';', encoding='utf-8', index=False, header=False)
+        print("Generating master report to", report)
+        write_report(df0, report)
 
-else:
-    print('No Known Source Specified')
+    else:
+        print('No Known Source Specified')
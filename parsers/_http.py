@@ -0,0 +1,52 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+import time
+
+
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:60.0) Gecko/20100101 Firefox/60.0"
+
+
+class RateLimiter(object):
+    '''
+    spaces requests to at most `rate` per second across every thread
+    sharing the limiter, so concurrent workers stay polite to a site
+    without each one sleeping between its own requests
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+def _build_session():
+    '''
+    one pooled session with retries for every parser, so keep-alive
+    connections are reused across pages, states and source sites.
+    both source apis are POST searches, so those are retried too
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(total=3, backoff_factor=0.5,
+                          status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=['GET', 'POST'])
+        )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent': USER_AGENT})
+
+    return session
+
+
+SESSION = _build_session()
@@ -1,158 +1,235 @@
+from concurrent.futures import ThreadPoolExecutor
+from parsers import _http
 import bs4
-import requests
-import json
+import functools
 import csv
+import os
+import pathlib
 import re
+import tempfile
+import threading
+import urllib.parse
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+# trailing country names and zip codes vary between arena-guide listings,
+# match an optional zip followed by an optional country in one pass
+_TRAILER_RE = re.compile(
+    r"(?:\s?\d+)?\s*(?:United States of America|United States|USA)?$")
+
+# only the rink listing grid is needed out of each page of html
+ARENA_STRAINER = bs4.SoupStrainer('div', class_="jet-listing-grid jet-listing")
+
+# how many pages to fetch at once, and how many requests per second
+# all of them together may send
+ARENA_PARALLEL = int(os.environ.get("ARENA_PARALLEL", "8"))
+_limiter = _http.RateLimiter(4)
+
+# set ARENA_USE_CACHE to keep raw pages on disk and reuse them on later
+# runs instead of crawling the site again
+ARENA_USE_CACHE = bool(os.environ.get("ARENA_USE_CACHE"))
+_CACHE_DIR = pathlib.Path('.arena_cache')
+
+
+# the jet smart filters form arena-guide expects, minus the page number
+FORM_TEMPLATE = {
+    'action': ['jet_smart_filters'],
+    'provider': ['jet-engine/arenas-with-pagination'],
+    'settings[lisitng_id]': ['40'],
+    'settings[columns]': ['2'],
+    'settings[columns_tablet]': '',
+    'settings[columns_mobile]': ['1'],
+    'settings[column_min_width]': ['240'],
+    'settings[column_min_width_tablet]': '',
+    'settings[column_min_width_mobile]': '',
+    'settings[inline_columns_css]': ['false'],
+    'settings[is_archive_template]': ['yes'],
+    'settings[post_status][]': ['publish'],
+    'settings[use_random_posts_num]': '',
+    'settings[posts_num]': ['6'],
+    'settings[max_posts_num]': ['9'],
+    'settings[not_found_message]': ['No data was found'],
+    'settings[is_masonry]': '',
+    'settings[equal_columns_height]': '',
+    'settings[use_load_more]': '',
+    'settings[load_more_id]': '',
+    'settings[load_more_type]': ['click'],
+    'settings[load_more_offset][unit]': ['px'],
+    'settings[load_more_offset][size]': ['0'],
+    'settings[loader_text]': '',
+    'settings[loader_spinner]': '',
+    'settings[use_custom_post_types]': '',
+    'settings[hide_widget_if]': '',
+    'settings[carousel_enabled]': '',
+    'settings[slides_to_scroll]': ['1'],
+    'settings[arrows]': ['true'],
+    'settings[arrow_icon]': ['fa fa-angle-left'],
+    'settings[dots]': '',
+    'settings[autoplay]': ['true'],
+    'settings[pause_on_hover]': ['true'],
+    'settings[autoplay_speed]': ['5000'],
+    'settings[infinite]': ['true'],
+    'settings[center_mode]': '',
+    'settings[effect]': ['slide'],
+    'settings[speed]': ['500'],
+    'settings[inject_alternative_items]': '',
+    'settings[scroll_slider_enabled]': '',
+    'settings[scroll_slider_on][]': ['desktop'],
+    'settings[scroll_slider_on][]': ['tablet'],
+    'settings[scroll_slider_on][]': ['mobile'],
+    'settings[custom_query]': ['yes'],
+    'settings[_element_id]': ['arenas-with-pagination'],
+    'props[found_posts]': ['1773'],
+    'props[max_num_pages]': ['89'],
+    'props[page]': ['1'],
+    'props[query_type]': ['posts'],
+    'props[query_id]': ['s'],
+    'referrer[uri]': ['/locations/usa/'],
+    'referrer[info]': '',
+    'referrer[self]': ['/index.php']
+}
+
+STATIC_BODY = urllib.parse.urlencode(FORM_TEMPLATE, doseq=True)
+
+
+# arena-guide hands out its cookies on the locations page, that is visited
+# once before the first page that actually has to be fetched
+_cookies_fetched = False
+_cookie_lock = threading.Lock()
+
+
+def _fetch_cookies(session):
+    '''
+    visits the locations page the first time any thread needs to post,
+    so a run served entirely from the page cache never goes to the network
+    '''
+    global _cookies_fetched
+    with _cookie_lock:
+        if not _cookies_fetched:
+            session.get("https://www.arena-guide.com/locations/usa")
+            _cookies_fetched = True
 
 
-def arena_guide_request(page_number):
+def _write_cache(cache_path, content):
+    '''
+    writes a page to a temp file beside the cache entry and moves it into
+    place, so an interrupted run never leaves a half written page behind
+    '''
+    _CACHE_DIR.mkdir(exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def arena_guide_request(session, page_number):
     '''
     This function is used to build the request dynamically.
     '''
 
+    cache_path = _CACHE_DIR / f"{page_number}.json"
+    if ARENA_USE_CACHE and cache_path.exists():
+        return json_loads(cache_path.read_bytes())
+
     url = r"https://www.arena-guide.com/wp-admin/admin-ajax.php?action=jet-engines/arenas-with-pagination"
-    session = requests.Session()
-    session.get("https://www.arena-guide.com/locations/usa")
-
-    formdata = {
-        'action': ['jet_smart_filters'],
-        'provider': ['jet-engine/arenas-with-pagination'],
-        'settings[lisitng_id]': ['40'],
-        'settings[columns]': ['2'],
-        'settings[columns_tablet]': '',
-        'settings[columns_mobile]': ['1'],
-        'settings[column_min_width]': ['240'],
-        'settings[column_min_width_tablet]': '',
-        'settings[column_min_width_mobile]': '',
-        'settings[inline_columns_css]': ['false'],
-        'settings[is_archive_template]': ['yes'],
-        'settings[post_status][]': ['publish'],
-        'settings[use_random_posts_num]': '',
-        'settings[posts_num]': ['6'],
-        'settings[max_posts_num]': ['9'],
-        'settings[not_found_message]': ['No data was found'],
-        'settings[is_masonry]': '',
-        'settings[equal_columns_height]': '',
-        'settings[use_load_more]': '',
-        'settings[load_more_id]': '',
-        'settings[load_more_type]': ['click'],
-        'settings[load_more_offset][unit]': ['px'],
-        'settings[load_more_offset][size]': ['0'],
-        'settings[loader_text]': '',
-        'settings[loader_spinner]': '',
-        'settings[use_custom_post_types]': '',
-        'settings[hide_widget_if]': '',
-        'settings[carousel_enabled]': '',
-        'settings[slides_to_scroll]': ['1'],
-        'settings[arrows]': ['true'],
-        'settings[arrow_icon]': ['fa fa-angle-left'],
-        'settings[dots]': '',
-        'settings[autoplay]': ['true'],
-        'settings[pause_on_hover]': ['true'],
-        'settings[autoplay_speed]': ['5000'],
-        'settings[infinite]': ['true'],
-        'settings[center_mode]': '',
-        'settings[effect]': ['slide'],
-        'settings[speed]': ['500'],
-        'settings[inject_alternative_items]': '',
-        'settings[scroll_slider_enabled]': '',
-        'settings[scroll_slider_on][]': ['desktop'],
-        'settings[scroll_slider_on][]': ['tablet'],
-        'settings[scroll_slider_on][]': ['mobile'],
-        'settings[custom_query]': ['yes'],
-        'settings[_element_id]': ['arenas-with-pagination'],
-        'props[found_posts]': ['1773'],
-        'props[max_num_pages]': ['89'],
-        'props[page]': ['1'],
-        'props[query_type]': ['posts'],
-        'props[query_id]': ['s'],
-        'paged': [page_number],
-        'referrer[uri]': ['/locations/usa/'],
-        'referrer[info]': '',
-        'referrer[self]': ['/index.php']
-    }
 
     headers = {
         "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
         "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Encoding": "gzip, deflate, br",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:60.0) Gecko/20100101 Firefox/60.0"
+        "Accept-Encoding": "gzip, deflate"
     }
 
-    r = session.post(url, headers=headers, data=formdata)
-    content = json.loads(r.text)
+    # only the page number changes between requests
+    body = STATIC_BODY + '&' + urllib.parse.urlencode({'paged': page_number})
+    _fetch_cookies(session)
+    _limiter.wait()
+    r = session.post(url, headers=headers, data=body)
+    r.raise_for_status()
+    content = json_loads(r.content)
+
+    if ARENA_USE_CACHE:
+        _write_cache(cache_path, r.content)
 
     return content
 
 
-def pull_arena_guide_pages():
+def _clean_address(raw_text):
+    '''
+    remove unneeded, inconsitent country and zip data
+    these are/should be unique to the arena-guide data source.
+    returns None for website URL's, we knock those out for now
+    '''
+    location = _TRAILER_RE.sub("", raw_text.strip(), count=1)
+    location = location.strip().rstrip(',')
+
+    if 'http' in location:
+        return None
+    return location
+
+
+def pull_arena_guide_pages(session):
     '''
     First, we need to send a request to get a total number
-    of pages in the pagination settings
+    of pages in the pagination settings. that request is the first
+    page, so its content is handed back too instead of fetching it again
     '''
 
     page_number = 1
-    data = arena_guide_request(page_number)
+    data = arena_guide_request(session, page_number)
 
-    return int(data['pagination']['found_posts'])
+    return int(data['pagination']['max_num_pages']), data
 
 
 def pull_arena_guide_content():
     '''
-    Take the amount of pages we have, and build a loop
+    Take the amount of pages we have and fetch them concurrently,
+    the requests are pure network wait so threads overlap them.
     For each page, build a list of names and addresses
-    Appened a dict with name and address on every rink
-    Return a list of dicts
+    Pair every name with its address
+    Return a list of (name, address) tuples
     '''
 
-    page_number = 20
-    pages = pull_arena_guide_pages()
+    session = _http.SESSION
+    pages, first_page = pull_arena_guide_pages(session)
     rinks = []
     rink_names = []
     rink_addresses = []
 
-    for i in range(pages):
-        page_number = i + 1
-        content = arena_guide_request(page_number)
-        soup = bs4.BeautifulSoup(content['content'], "lxml")
+    # map hands the pages back in page order, same as the old serial loop
+    with ThreadPoolExecutor(max_workers=ARENA_PARALLEL) as executor:
+        request = functools.partial(arena_guide_request, session)
+        contents = [first_page]
+        contents.extend(executor.map(request, range(2, pages + 1)))
+
+    for content in contents:
+        soup = bs4.BeautifulSoup(content['content'], "lxml",
+                                 parse_only=ARENA_STRAINER)
         main = soup.find_all('div', class_="jet-listing-grid jet-listing")
 
         for entry in main:
-            # returns a list of rink names with html
-            rink_name = entry.find_all('h2')
-            # retuns a list of rink addresses with html
-            rink_address = entry.find_all('span', class_="elementor-icon-list-text")
-
-            # if the find_all failed, the text.strip will fail
-            # for now, we dont care.
-            for rink in rink_name:
-                if rink is None:
-                    pass
-                else:
-                    rink_names.append(rink.text.strip())
-
-            for addr in rink_address:
-                if addr is None:
-                    pass
-                else:
-                    # remove unneeded, inconsitent country and zip data
-                    # these are/should be unique to the arena-guide data source
-                    location = addr.text.strip()
-                    location = location.removesuffix("United States of America").strip()
-                    location = location.removesuffix("United States").strip()
-                    location = location.removesuffix("USA").strip()
-                    location = re.sub(r"\s?\d+$", "", location).strip()
-                    location = location.rstrip(',')
-                    # knock out any website URL's for now
-                    if 'http' not in location:
+            # one walk over the card picks up both the rink names (h2)
+            # and the rink addresses (the icon list spans)
+            for tag in entry.find_all(['h2', 'span']):
+                if tag.name == 'h2':
+                    rink_names.append(tag.text.strip())
+                elif 'elementor-icon-list-text' in tag.get('class', []):
+                    location = _clean_address(tag.text)
+                    if location is not None:
                         rink_addresses.append(location)
 
     #get the sizes of both name/address lists for comparing
     rink_names_size = len(rink_names)
     rink_addresses_size = len(rink_addresses)
     if rink_names_size == rink_addresses_size:
-        for x in range(rink_names_size):
-            rinks.append({'name': rink_names[x], 'address': rink_addresses[x]})
+        rinks = list(zip(rink_names, rink_addresses))
 
     return rinks
 
@@ -164,10 +241,8 @@ def arena_guide_csv(path):
     '''
     data = pull_arena_guide_content()
 
-    with open(path, 'w', encoding='utf8', newline='') as output_file:
-        fc = csv.DictWriter(
-            output_file,
-            fieldnames=data[0].keys(),
-            delimiter=';'
-            )
+    # one big buffer so the rows go out in a few large writes
+    with open(path, 'w', encoding='utf8', newline='',
+              buffering=1 << 20) as output_file:
+        fc = csv.writer(output_file, delimiter=';')
         fc.writerows(data)
\ No newline at end of file
@@ -1,22 +1,37 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from parsers import _http
+import functools
 import csv
+import os
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
-def pull_lts_data(stateID):
+
+# how many states to fetch at once, and how many requests per second
+# all of them together may send
+LTS_PARALLEL = int(os.environ.get("LTS_PARALLEL", "8"))
+_limiter = _http.RateLimiter(4)
+
+
+def pull_lts_data(session, stateID):
     headers = {
         "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
         "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Encoding": "gzip, deflate, br",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:60.0) Gecko/20100101 Firefox/60.0"
+        "Accept-Encoding": "gzip, deflate"
     }
 
     url = 'https://www.learntoskateusa.com/umbraco/surface/Map/GetPointsFromSearch'
 
     raw_data = f'facilityName=&stateId={stateID}&zip=&radius=2000'
 
-    r = requests.post(url, headers=headers, data=raw_data)
+    _limiter.wait()
+    r = session.post(url, headers=headers, data=raw_data)
+    r.raise_for_status()
 
-    data = r.json()
+    data = json_loads(r.content)
     results = data['programs']
 
     return results
@@ -24,13 +39,17 @@ def pull_lts_data(stateID):
 
 def aggr_lts():
     rinks = []
-    for i in range(50):
-        stateID = i + 1
-        state_data = pull_lts_data(stateID)
+    # every state is an independent request, overlap them with threads.
+    # map hands results back in state order
+    with ThreadPoolExecutor(max_workers=LTS_PARALLEL) as executor:
+        request = functools.partial(pull_lts_data, _http.SESSION)
+        results = list(executor.map(request, range(1, 51)))
+
+    # keep only the columns the csv needs, as plain tuples
+    for state_data in results:
         for rink in state_data:
-            update_rink = {"Name": ' '}
-            update_rink.update(rink)
-            rinks.append(update_rink)
+            rinks.append((rink.get('Name', ' '), rink.get('StreetOne', ''),
+                          rink.get('City', ''), rink.get('StateCode', '')))
     return rinks
 
 
@@ -38,11 +57,9 @@ def lts_csv(path):
 
     rinks = aggr_lts()
 
-    with open(path, 'w', encoding='utf8', newline='') as output_file:
-        fc = csv.DictWriter(
-            output_file,
-            extrasaction='ignore',
-            delimiter=';',
-            fieldnames=['Name', 'StreetOne', 'City', 'StateCode']
-            )
+    # one big buffer so the rows go out in a few large writes
+    with open(path, 'w', encoding='utf8', newline='',
+              buffering=1 << 20) as output_file:
+        # rows are Name, StreetOne, City, StateCode
+        fc = csv.writer(output_file, delimiter=';')
         fc.writerows(rinks)
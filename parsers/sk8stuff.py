@@ -1,7 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
 from utils import common
-import requests
-import bs4
+from parsers import _http
 import csv
+import lxml.html
+import os
+import re
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+# how many states to fetch at once, and how many requests per second
+# all of them together may send
+SK8STUFF_PARALLEL = int(os.environ.get("SK8STUFF_PARALLEL", "8"))
+_limiter = _http.RateLimiter(4)
+
+# separators that would break the csv, swapped out of names and streets
+_NAME_RE = re.compile(r'[;,]')
+_STREET_RE = re.compile(r'[,\n]')
+
+# column order of the raw csv, there is no header row
+FIELDS = ['name', 'street', 'city', 'state']
+
+
+def _parse_rows(req):
+    '''
+    returns the text of every cell, row by row, from the first table on a
+    sk8stuff page. selectolax's lexbor parser is used when installed,
+    otherwise lxml's html parser with xpath. lexbor reads raw bytes as
+    utf-8 no matter what the page says, so it gets the text requests
+    already decoded, while lxml sorts out the charset from the bytes
+    '''
+    if LexborHTMLParser is not None:
+        tree = LexborHTMLParser(req.text)
+        table = tree.css_first('table')
+        return [[cell.text() for cell in row.css('td')]
+                for row in table.css('tr')]
+
+    doc = lxml.html.fromstring(req.content)
+    return [[cell.text_content() for cell in row.xpath('.//td')]
+            for row in doc.xpath('(//table)[1]//tr')]
 
 
 def pull_sk8stuff(state):
@@ -13,21 +53,18 @@ def pull_sk8stuff(state):
 
     rinks = []
     url = 'http://sk8stuff.com/utility/lister_rinks.asp?stap={}'.format(state)
-    req = requests.get(url)
+    _limiter.wait()
+    req = _http.SESSION.get(url)
     # req.status_code
-    soup = bs4.BeautifulSoup(req.text, 'html.parser')
+    rows = _parse_rows(req)
 
-    table = soup.find_all('table')[0]
-    rows = table.find_all('tr')
-
-    for row in rows[2:]:
+    for cells in rows[2:]:
         # replace and 'fix' wierd characters
-        cells = row.find_all('td')
-        name = cells[0].text
-        street = cells[1].text
-        rink_name = name.strip().replace(';', ' -').replace(',', ' -')
-        rink_street = street.strip().replace(',', ' ').replace("\n", " ")
-        rink_city_state = cells[2].text.strip()
+        name = cells[0]
+        street = cells[1]
+        rink_name = _NAME_RE.sub(' -', name.strip())
+        rink_street = _STREET_RE.sub(' ', street.strip())
+        rink_city_state = cells[2].strip()
         rink_city = rink_city_state.rsplit(' ', 1)[0]
         rink = {'name': rink_name,
                 'street': rink_street,
@@ -42,15 +79,14 @@ def aggr_sk8stuff():
     '''
     This function simply fetches all
     rinks via sk8stuff for all states
-    returns lists of dicts
+    yields a list of dicts per state, in state order
     '''
 
-    rinks = []
+    # every state is an independent page, overlap them with threads.
+    # map hands results back in state order as they finish
     states = common.country_us.states
-    for state in states:
-        rinks.append(pull_sk8stuff(state))
-
-    return rinks
+    with ThreadPoolExecutor(max_workers=SK8STUFF_PARALLEL) as executor:
+        yield from executor.map(pull_sk8stuff, states)
 
 
 def sk8stuff_csv(path):
@@ -58,23 +94,18 @@ def sk8stuff_csv(path):
     produces a csv file of the data pulled directly from sk8stuff.
     use this file as a cache or direct data processing
     '''
-    data = aggr_sk8stuff()
 
-    # flatten the results
-    master_rink_list = []
-    for y in data:
-        for x in y:
-            # sk8stuff puts a dummy rink in the data
-            # so remove it.
-            if 'Junk Rink' in x['name']:
-                pass
-            else:
-                master_rink_list.append(x)
-
-    with open(path, 'w', encoding='utf8', newline='') as output_file:
+    # one writer for the whole file, each state is written out as it
+    # arrives instead of collecting every rink first
+    with open(path, 'w', encoding='utf8', newline='',
+              buffering=1 << 20) as output_file:
         fc = csv.DictWriter(
             output_file,
-            fieldnames=master_rink_list[0].keys(),
+            fieldnames=FIELDS,
             delimiter=';'
             )
-        fc.writerows(master_rink_list)
+        for state_rinks in aggr_sk8stuff():
+            # sk8stuff puts a dummy rink in the data
+            # so remove it.
+            fc.writerows(x for x in state_rinks
+                         if 'Junk Rink' not in x['name'])
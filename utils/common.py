@@ -1,4 +1,19 @@
+import functools
+import multiprocessing
+import os
 import re
+import string
+import usaddress
+
+
+# every ascii character the [^\w\s] punctuation pattern would strip
+_PUNCT_TABLE = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128))
+    if not (c.isalnum() or c == '_' or c.isspace())
+    ))
+
+# and the pattern itself, for text that is not plain ascii
+_PUNCT_RE = re.compile(r'[^\w\s]')
 
 
 # add some locale data
@@ -184,11 +199,17 @@ class country_us(object):
 
     def _remove_punctuation(input_text):
         try:
-            output_text = re.sub(r'[^\w\s]', '', input_text)
+            if input_text.isascii():
+                output_text = input_text.translate(_PUNCT_TABLE)
+            else:
+                output_text = _PUNCT_RE.sub('', input_text)
         except:
             output_text = input_text
         return output_text
 
+    # names are expanded row by row, and the same rink name comes through
+    # many times over across chunks and sources, so remember the answers
+    @functools.lru_cache(maxsize=None)
     def _expand_rec_ctrs(input_text):
         abbr_dict = {'rec': 'recreation', 'ctr': 'center'}
 
@@ -206,9 +227,112 @@ class country_us(object):
         return new_text
 
 
+@functools.lru_cache(maxsize=None)
 def reset_utf8(input_text):
     try:
         output_text = input_text.encode('ISO-8859-1').decode('utf8')
     except:
         output_text = input_text
     return output_text
+
+
+def apply_unique(series, func):
+    '''
+    applies func once per distinct value of series and maps the results
+    back. city and street columns repeat the same values many times over
+    '''
+    mapping = {value: func(value) for value in series.dropna().unique()}
+    return series.map(mapping)
+
+
+# libpostal parses addresses in C but needs the native library installed,
+# so it is opt in
+USE_LIBPOSTAL = os.environ.get('ICEMAKER_USE_LIBPOSTAL') == '1'
+
+if USE_LIBPOSTAL:
+    from postal.parser import parse_address
+
+
+def _tag_libpostal(address):
+    '''
+    adapts libpostal's (value, label) pairs to the usaddress tag shape the
+    formatters read. libpostal lowercases its output, so casing is put
+    back, and a missing component raises KeyError like usaddress would
+    '''
+    parts = {label: value for value, label in parse_address(address)}
+    street_name, _, post_type = parts['road'].rpartition(' ')
+    state = parts['state']
+
+    tagged = {
+        'PlaceName': string.capwords(parts['city']),
+        'StateName': state.upper() if len(state) == 2 else string.capwords(state)
+        }
+    if street_name:
+        tagged['StreetName'] = string.capwords(street_name)
+        tagged['StreetNamePostType'] = string.capwords(post_type)
+    else:
+        tagged['StreetName'] = string.capwords(post_type)
+
+    return tagged, 'Street Address'
+
+
+@functools.lru_cache(maxsize=None)
+def _tag_cached(address):
+    if USE_LIBPOSTAL:
+        return _tag_libpostal(address)
+    return usaddress.tag(address)
+
+
+def tag_address(address):
+    '''
+    usaddress.tag with whitespace collapsed first, so rinks re-listed with
+    spacing variations share one cached parse instead of re-running the
+    CRF tagger. callers must treat the result as read only
+    '''
+    return _tag_cached(' '.join(address.split()))
+
+
+def warm_tagger():
+    '''
+    pool initializer, loads the tagger model and runs one parse so every
+    worker pays that cost at startup instead of on its first real row
+    '''
+    tag_address("1 Main St, Springfield, IL")
+
+
+# how many tagger processes an address pool starts. every core by default,
+# share_cores lowers it when several formatters run at the same time
+POOL_SIZE = os.cpu_count() or 1
+
+
+def share_cores(ways):
+    '''
+    executor initializer for running `ways` formatters side by side, each
+    one's address pool gets its share of the cores instead of all of them
+    '''
+    global POOL_SIZE
+    POOL_SIZE = max(1, (os.cpu_count() or 1) // ways)
+
+
+def address_pool():
+    '''
+    a process pool of POOL_SIZE workers for address tagging. callers
+    that tag in several batches should share one pool between them
+    '''
+    return multiprocessing.Pool(POOL_SIZE, initializer=warm_tagger)
+
+
+def parallel_map(func, values, pool=None):
+    '''
+    runs func over every value using an address pool, one process per
+    cpu core unless the cores are shared out with share_cores.
+    usaddress tagging is pure python and every address is independent,
+    so the formatters split that work across all cores.
+    results come back in the same order as values
+    '''
+    if pool is not None:
+        return pool.map(func, values)
+
+    with address_pool() as pool:
+        results = pool.map(func, values)
+    return results